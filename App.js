@@ -34,6 +34,9 @@ import { io } from 'socket.io-client';
 
 // Base URL of your Python server
 const API_BASE_URL = 'http://127.0.0.1:5000';
+// Websocket only: the server runs several Gunicorn workers without sticky
+// sessions, so HTTP long-polling requests could land on different workers.
+const SOCKET_OPTIONS = { transports: ['websocket'] };
 
 // --- CSS INJECTION (This is required) ---
 const injectCSS = () => {
@@ -131,13 +134,19 @@ function ReusableDashboard({ filter }) {
     fetchData();
 
     // 2. Connect to the socket server
-    const socket = io(API_BASE_URL);
+    const socket = io(API_BASE_URL, SOCKET_OPTIONS);
 
     // 3. Listen for the 'new_feedback' event
     socket.on('new_feedback', (data) => {
       console.log('New feedback received! Refreshing dashboard...');
       fetchData(); // Re-run the fetch logic
     });
+
+    // Bulk imports send one event for the whole batch
+    socket.on('new_feedback_batch', (data) => {
+      console.log(`${data.count} new feedback received! Refreshing dashboard...`);
+      fetchData();
+    });
     
     // 4. Clean up the connection when the component unmounts
     return () => {
@@ -411,13 +420,19 @@ function AlertsScreen() {
     fetchAlerts();
 
     // 2. Connect to the socket server
-    const socket = io(API_BASE_URL);
+    const socket = io(API_BASE_URL, SOCKET_OPTIONS);
 
     // 3. Listen for events
     socket.on('new_feedback', (data) => {
       console.log('New feedback received! Refreshing alerts...');
       fetchAlerts();
     });
+
+    // Bulk imports send one event for the whole batch
+    socket.on('new_feedback_batch', (data) => {
+      console.log(`${data.count} new feedback received! Refreshing alerts...`);
+      fetchAlerts();
+    });
     
     socket.on('feedback_resolved', (data) => {
       console.log(`Feedback ${data.id} resolved. Removing from alerts.`);
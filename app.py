@@ -1,16 +1,32 @@
 import os
-from flask import Flask, request, jsonify
+# --- Async server ---
+# eventlet has to patch the standard library before anything else is imported.
+ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    import eventlet.tpool
+    eventlet.monkey_patch()
+
+import queue
+import sqlite3
+import threading
+import time
+import orjson
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import event, func, select, update
+from sqlalchemy.engine import Engine
 from datetime import datetime, date, timedelta 
-from textblob import TextBlob
 from flask_cors import CORS
+import redis
+from cachelib import RedisCache, SimpleCache
 # --- NEW IMPORTS ---
 from flask_socketio import SocketIO
 # --- END NEW IMPORTS ---
 
 # --- ML IMPORTS ---
-from transformers import pipeline
+from classifier import CANDIDATE_LABELS, classify
+from sentiment import polarity, polarity_batch
 
 # --- 1. Configuration ---
 
@@ -18,39 +34,207 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'feedback.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep compiled SQL around so repeated dashboard queries skip recompilation
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'query_cache_size': 1200}
 CORS(app)
 
 # --- NEW: Initialize SocketIO ---
-# Allow all origins for simplicity in development
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Allow all origins for simplicity in development. Emits go through the Redis
+# message queue so every Gunicorn worker's clients receive them; set
+# SOCKETIO_MESSAGE_QUEUE to an empty string to run a single process without Redis.
+MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', 'redis://localhost:6379/0') or None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, message_queue=MESSAGE_QUEUE)
 # --- END NEW ---
 
 db = SQLAlchemy(app)
 
-# --- Load the ML Model ---
-print("Loading classification model...")
-classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-print("Model loaded successfully.")
+# WAL lets dashboard reads carry on while feedback is being written, and
+# synchronous=NORMAL is safe under WAL while skipping most fsyncs.
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection): return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+# Dashboards poll the metrics endpoints far more often than feedback arrives,
+# so their responses are kept for a few seconds, keyed by the full query
+# string. Anything that changes feedback rows clears it. The cache lives in
+# the Socket.IO Redis so a write through one worker clears it for all of them;
+# key_prefix keeps clear() to these keys rather than flushing the database.
+if MESSAGE_QUEUE:
+    metrics_cache = RedisCache(redis.Redis.from_url(MESSAGE_QUEUE), default_timeout=15, key_prefix='metrics:')
+else:
+    metrics_cache = SimpleCache(default_timeout=15)
 
-# --- 2. Database Models (No Changes) ---
+# --- 2. Database Models ---
+# The composite indices follow build_filtered_query's filters and the
+# metrics GROUP BY, so dashboard queries are index range scans.
 class Store(db.Model):
+    __table_args__ = (db.Index('ix_store_area', 'area'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     area = db.Column(db.String(200), nullable=True) 
     feedbacks = db.relationship('Feedback', backref='store', lazy=True)
 
+def day_bucket(ts):
+    return ts.year * 10000 + ts.month * 100 + ts.day
+
+def timestamp_day(context):
+    # Default for Feedback.day, so rows inserted without one still get a day
+    return day_bucket(context.get_current_parameters().get('timestamp') or datetime.utcnow())
+
 class Feedback(db.Model):
+    __table_args__ = (
+        db.Index('ix_fb_ts_store_status', 'timestamp', 'store_id', 'status'),
+        db.Index('ix_fb_cat_sent', 'category', 'sentiment'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     platform = db.Column(db.String(100), nullable=False)
     text = db.Column(db.String(1000), nullable=False)
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-    category = db.Column(db.String(100), nullable=True)
-    sentiment = db.Column(db.String(50), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # timestamp's date as YYYYMMDD, so the daily trend groups by a plain integer
+    day = db.Column(db.Integer, index=True, default=timestamp_day)
+    # Stored as small integer codes (see CATEGORY_IDS / SENTIMENT_IDS) and
+    # translated back to names when read
+    category = db.Column(db.SmallInteger, nullable=True)
+    sentiment = db.Column(db.SmallInteger, nullable=True)
     sentiment_score = db.Column(db.Float, nullable=True)
     store_id = db.Column(db.Integer, db.ForeignKey('store.id'), nullable=True)
     status = db.Column(db.String(50), nullable=False, default='New')
 
-# --- 3. API Endpoints ---
+# Category codes are positions in CANDIDATE_LABELS, so new labels must be appended
+CATEGORY_IDS = {label: i for i, label in enumerate(CANDIDATE_LABELS)}
+SENTIMENTS = ["Negative", "Neutral", "Positive"]
+SENTIMENT_IDS = {name: i for i, name in enumerate(SENTIMENTS)}
+
+# --- 3. Background Inference Worker ---
+# The classifier is far too slow to run inside a request, so new
+# feedback is saved as 'Pending' and its id is queued here. A single worker
+# thread drains the queue in small batches and runs one batched forward pass
+# per batch instead of one per feedback item.
+BATCH_MAX = 16
+BATCH_TIMEOUT = 0.05  # seconds to wait for more items before running a batch
+# A failed batch is retried one item at a time, this many times per item
+# RETRY_DELAY seconds apart. Items that still fail are released as 'New'
+# without a category so they show up on the dashboards instead of vanishing.
+INFERENCE_RETRIES = 3
+RETRY_DELAY = 1.0
+
+infer_queue = queue.Queue()
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+def start_inference_worker():
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None: return
+        _worker_thread = threading.Thread(target=inference_worker, name='inference-worker', daemon=True)
+        _worker_thread.start()
+    # Rows still 'Pending' were queued in a process that has since exited
+    # (or failed to save them), so pick them up again.
+    with app.app_context():
+        pending_ids = db.session.execute(select(Feedback.id).where(Feedback.status == 'Pending')).scalars().all()
+    for feedback_id in pending_ids:
+        infer_queue.put(feedback_id)
+
+@app.before_request
+def ensure_inference_worker():
+    # Started from the first request rather than at import, so it runs in
+    # each Gunicorn worker and never in the preloading master.
+    if _worker_thread is None: start_inference_worker()
+
+def enqueue_inference(feedback_id):
+    infer_queue.put(feedback_id)
+
+def inference_worker():
+    while True:
+        ids = [infer_queue.get()]
+        try:
+            while len(ids) < BATCH_MAX:
+                ids.append(infer_queue.get(timeout=BATCH_TIMEOUT))
+        except queue.Empty:
+            pass
+        try:
+            classify_pending(ids)
+        except Exception as e:
+            print(f"Error: inference batch {ids} failed. {e}")
+            retry_individually(ids)
+
+def retry_individually(ids):
+    # One at a time, so a single bad item can't sink the rest of its batch
+    for feedback_id in ids:
+        for attempt in range(1, INFERENCE_RETRIES + 1):
+            time.sleep(RETRY_DELAY)
+            try:
+                classify_pending([feedback_id])
+                break
+            except Exception as e:
+                print(f"Error: inference retry {attempt} for feedback {feedback_id} failed. {e}")
+        else:
+            release_unclassified(feedback_id)
+
+def release_unclassified(feedback_id):
+    try:
+        with app.app_context():
+            db.session.execute(
+                update(Feedback).where(Feedback.id == feedback_id, Feedback.status == 'Pending').values(status='New')
+            )
+            db.session.commit()
+    except Exception as e:
+        # Still 'Pending', so the next worker start queues it again
+        print(f"Error: could not release feedback {feedback_id}. {e}")
+        return
+    metrics_cache.clear()
+    socketio.emit('new_feedback', {
+        'message': f'New feedback {feedback_id} added', 'id': feedback_id,
+        'category': None, 'category_confidence': None
+    })
+
+def run_blocking(fn, *args):
+    # Under eventlet the worker is a green thread, so CPU-bound model calls
+    # run in eventlet's native thread pool to keep the server responsive.
+    if ASYNC_MODE == 'eventlet':
+        return eventlet.tpool.execute(fn, *args)
+    return fn(*args)
+
+def classify_pending(ids):
+    with app.app_context():
+        # Only the columns the classifier needs, no ORM objects. Rows someone
+        # else already classified (e.g. another worker after a restart) are skipped.
+        items = db.session.execute(select(Feedback.id, Feedback.text).where(
+            Feedback.id.in_(ids), Feedback.status == 'Pending'
+        )).all()
+        if not items: return
+        results = run_blocking(classify, [item.text for item in items])
+        # A row may have been resolved, or classified by another worker, while
+        # the model ran, so each UPDATE only touches it if it is still
+        # 'Pending' and its rowcount says whether it was ours to announce.
+        # A single commit for the whole batch.
+        classified = []
+        for item, (category, confidence) in zip(items, results):
+            updated = db.session.execute(
+                update(Feedback).where(Feedback.id == item.id, Feedback.status == 'Pending')
+                .values(category=CATEGORY_IDS[category], status='New')
+            ).rowcount
+            if updated: classified.append((item.id, category, confidence))
+        db.session.commit()
+        if not classified: return
+        metrics_cache.clear()
+        # This sends a 'new_feedback' message to all connected clients
+        for feedback_id, category, confidence in classified:
+            socketio.emit('new_feedback', {
+                'message': f'New feedback {feedback_id} added', 'id': feedback_id,
+                'category': category, 'category_confidence': confidence
+            })
+
+# --- 4. API Endpoints ---
+
+def sentiment_label(polarity_score):
+    if polarity_score > 0.2: return "Positive"
+    if polarity_score < -0.1: return "Negative"
+    return "Neutral"
 
 @app.route('/v1/feedback', methods=['POST'])
 def add_feedback():
@@ -60,43 +244,80 @@ def add_feedback():
 
     feedback_text = data['text']
     
-    # --- Analysis (No Change) ---
-    blob = TextBlob(feedback_text)
-    sentiment = "Neutral"
-    if blob.sentiment.polarity > 0.2: sentiment = "Positive"
-    elif blob.sentiment.polarity < -0.1: sentiment = "Negative"
-    candidate_labels = ["Quality of food", "Customer service", "Speed", "Ambience"]
-    result = classifier(feedback_text, candidate_labels)
-    category = result['labels'][0]
-    category_confidence = result['scores'][0]
-
-    new_feedback = Feedback(
-        platform=data['platform'], text=data['text'], category=category,
-        sentiment=sentiment, sentiment_score = blob.sentiment.polarity,
-        store_id=data.get('store_id'), status='New'
-    )
-    
-    db.session.add(new_feedback)
+    # --- Sentiment is cheap, so it stays on the request thread ---
+    polarity_score = polarity(feedback_text)
+    sentiment = sentiment_label(polarity_score)
+
+    # --- Category is filled in later by the inference worker ---
+    now = datetime.utcnow()
+    # Nothing is read back before the commit, so skip the autoflush checks
+    with db.session.no_autoflush:
+        new_feedback = Feedback(
+            platform=data['platform'], text=data['text'], timestamp=now, day=day_bucket(now), category=None,
+            sentiment=SENTIMENT_IDS[sentiment], sentiment_score = polarity_score,
+            store_id=data.get('store_id'), status='Pending'
+        )
+        db.session.add(new_feedback)
     db.session.commit()
-    
-    # --- NEW: "SHOUT" THE UPDATE ---
-    # This sends a 'new_feedback' message to all connected clients
-    socketio.emit('new_feedback', {'message': f'New feedback {new_feedback.id} added'})
-    # --- END NEW ---
+    metrics_cache.clear()
+
+    enqueue_inference(new_feedback.id)
     
     return jsonify({
-        "message": "Feedback added successfully", "id": new_feedback.id,
-        "analysis": { "category": category, "category_confidence": category_confidence,
-                      "sentiment": sentiment, "polarity_score": blob.sentiment.polarity }
+        "message": "Feedback added successfully", "id": new_feedback.id, "status": "Pending",
+        "analysis": { "category": None, "category_confidence": None,
+                      "sentiment": sentiment, "polarity_score": polarity_score }
     }), 201
 
+# The whole list is classified inside one request, so its size is capped
+BATCH_ITEMS_MAX = 256
+
+@app.route('/v1/feedback/batch', methods=['POST'])
+def add_feedback_batch():
+    # Bulk import (e.g. scrape.py): one batched classifier call, one insert
+    # and one socket event for the whole list instead of one per item.
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else None
+    if not items or not isinstance(items, list):
+        return jsonify({"error": "Missing required data: items"}), 400
+    if len(items) > BATCH_ITEMS_MAX:
+        return jsonify({"error": f"Too many items: at most {BATCH_ITEMS_MAX} per request"}), 413
+    if any(not isinstance(item, dict) or 'text' not in item or 'platform' not in item for item in items):
+        return jsonify({"error": "Missing required data: platform and text"}), 400
+    if any(not isinstance(item['text'], str) or not isinstance(item['platform'], str) for item in items):
+        return jsonify({"error": "Invalid data: platform and text must be strings"}), 400
+
+    texts = [item['text'] for item in items]
+    results = run_blocking(classify, texts)
+    polarity_scores = polarity_batch(texts)
+    now = datetime.utcnow()
+    new_feedbacks = []
+    for item, (category, _), polarity_score in zip(items, results, polarity_scores):
+        new_feedbacks.append(Feedback(
+            platform=item['platform'], text=item['text'], timestamp=now, day=day_bucket(now),
+            category=CATEGORY_IDS[category], sentiment=SENTIMENT_IDS[sentiment_label(polarity_score)],
+            sentiment_score=polarity_score,
+            store_id=item.get('store_id'), status='New'
+        ))
+
+    db.session.bulk_save_objects(new_feedbacks)
+    db.session.commit()
+    metrics_cache.clear()
+
+    socketio.emit('new_feedback_batch', {'count': len(new_feedbacks)})
+
+    return jsonify({"message": "Feedback added successfully", "count": len(new_feedbacks)}), 201
+
 @app.route('/v1/feedback/<int:feedback_id>/resolve', methods=['POST'])
 def resolve_feedback(feedback_id):
-    feedback_item = Feedback.query.get(feedback_id)
-    if feedback_item is None:
-        return jsonify({"error": "Feedback item not found"}), 404
-    feedback_item.status = 'Resolved'
+    # A single UPDATE; the row (including its text) is never loaded
+    updated = db.session.execute(
+        update(Feedback).where(Feedback.id == feedback_id).values(status='Resolved')
+    ).rowcount
     db.session.commit()
+    if not updated:
+        return jsonify({"error": "Feedback item not found"}), 404
+    metrics_cache.clear()
     
     # --- NEW: "SHOUT" THIS UPDATE TOO ---
     # We send a specific event so the Alerts tab can refresh
@@ -105,80 +326,121 @@ def resolve_feedback(feedback_id):
     
     return jsonify({"message": f"Feedback {feedback_id} marked as Resolved"})
 
-# --- All other helper functions and endpoints (get_feedback, get_metrics, etc.) are unchanged ---
-def build_filtered_query():
+# --- Read endpoints use Core select() so rows come back as plain tuples ---
+def get_request_filters():
+    """
+    Parses the dashboard filters from the query string once per request and
+    stashes them on flask.g. Returns (area, conditions), or None if a date
+    is malformed.
+    """
+    if 'feedback_filters' in g: return g.feedback_filters
     start_date_str = request.args.get('start')
     end_date_str = request.args.get('end')
     store_id_str = request.args.get('store_id')
     area_str = request.args.get('area')
     status_str = request.args.get('status')
-    query = Feedback.query
-    if area_str:
-        query = query.join(Store).filter(Store.area == area_str)
+    conditions = []
     try:
         if start_date_str:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            query = query.filter(Feedback.timestamp >= start_date)
+            conditions.append(Feedback.timestamp >= start_date)
         if end_date_str:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            query = query.filter(Feedback.timestamp < (end_date + timedelta(days=1)))
+            conditions.append(Feedback.timestamp < (end_date + timedelta(days=1)))
         if store_id_str:
-            query = query.filter(Feedback.store_id == int(store_id_str))
+            conditions.append(Feedback.store_id == int(store_id_str))
         if status_str:
-            query = query.filter(Feedback.status == status_str)
+            conditions.append(Feedback.status == status_str)
     except ValueError:
-        return None 
-    return query
+        g.feedback_filters = None
+    else:
+        g.feedback_filters = (area_str, conditions)
+    return g.feedback_filters
+
+def build_filtered_query(query):
+    """
+    Applies the dashboard filters from the query string to a select()
+    statement. Returns None if a date is malformed.
+    """
+    filters = get_request_filters()
+    if filters is None: return None
+    area_str, conditions = filters
+    if area_str:
+        query = query.join(Store).filter(Store.area == area_str)
+    return query.filter(*conditions)
 
 @app.route('/v1/feedback', methods=['GET'])
 def get_feedback():
-    query = build_filtered_query()
+    query = build_filtered_query(select(
+        Feedback.id, Feedback.platform, Feedback.text, Feedback.timestamp, Feedback.category,
+        Feedback.sentiment, Feedback.sentiment_score, Feedback.store_id, Feedback.status
+    ))
     if query is None: return jsonify({"error": "Invalid date format"}), 400
-    all_feedback = query.order_by(Feedback.timestamp.desc()).all()
-    results = []
-    for feedback in all_feedback:
-        results.append({
-            "id": feedback.id, "platform": feedback.platform, "text": feedback.text,
-            "timestamp": feedback.timestamp.isoformat(), "category": feedback.category,
-            "sentiment": feedback.sentiment, "sentiment_score": feedback.sentiment_score,
-            "store_id": feedback.store_id, "status": feedback.status
-        })
-    return jsonify(results)
+
+    # Rows are serialized and sent as they come off the cursor instead of
+    # building the whole list in memory first. orjson formats the (naive UTC)
+    # timestamps itself in C, marked with a trailing Z.
+    def generate():
+        rows = db.session.execute(query.order_by(Feedback.timestamp.desc())).yield_per(500).mappings()
+        yield b'['
+        for i, row in enumerate(rows):
+            feedback = dict(row)
+            if row["category"] is not None: feedback["category"] = CANDIDATE_LABELS[row["category"]]
+            if row["sentiment"] is not None: feedback["sentiment"] = SENTIMENTS[row["sentiment"]]
+            yield (b',' if i else b'') + orjson.dumps(feedback, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+        yield b']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 @app.route('/v1/metrics', methods=['GET'])
 def get_metrics():
-    query = build_filtered_query()
+    cached = metrics_cache.get(request.full_path)
+    if cached is not None: return jsonify(cached)
+    # One GROUP BY over (category, sentiment) yields the total, the sentiment
+    # counts and the per-category numbers in a single roundtrip.
+    query = build_filtered_query(select(
+        Feedback.category, Feedback.sentiment, func.count(Feedback.id),
+        func.sum(Feedback.sentiment_score), func.count(Feedback.sentiment_score)
+    ).group_by(Feedback.category, Feedback.sentiment))
     if query is None: return jsonify({"error": "Invalid date format"}), 400
-    total_feedback = query.count()
-    category_metrics = query.group_by(Feedback.category).with_entities(
-        Feedback.category, func.count(Feedback.id).label('count'),
-        func.avg(Feedback.sentiment_score).label('average_sentiment')
-    ).all()
-    categories = {}
-    for c, count, avg in category_metrics: categories[c] = {"count": count, "average_sentiment_score": avg}
-    sentiment_counts = query.group_by(Feedback.sentiment).with_entities(
-        Feedback.sentiment, func.count(Feedback.id).label('count')
-    ).all()
+    total_feedback = 0
     sentiments = {"Positive": 0, "Negative": 0, "Neutral": 0}
-    for s, count in sentiment_counts:
-        if s in sentiments: sentiments[s] = count
-    return jsonify({
+    category_totals = {}
+    for c, s, count, score_sum, scored in db.session.execute(query):
+        total_feedback += count
+        if s is not None: sentiments[SENTIMENTS[s]] += count
+        # Pending feedback has no category until the inference worker picks it up
+        if c is None: continue
+        totals = category_totals.setdefault(CANDIDATE_LABELS[c], [0, 0.0, 0])
+        totals[0] += count
+        totals[1] += score_sum or 0.0
+        totals[2] += scored
+    categories = {}
+    for c, (count, score_sum, scored) in category_totals.items():
+        categories[c] = {"count": count, "average_sentiment_score": score_sum / scored if scored else None}
+    metrics = {
         "total_feedback": total_feedback,
         "feedback_by_sentiment": sentiments,
         "feedback_by_category": categories
-    })
+    }
+    metrics_cache.set(request.full_path, metrics)
+    return jsonify(metrics)
 
 @app.route('/v1/metrics/trend', methods=['GET'])
 def get_metrics_trend():
-    query = build_filtered_query()
+    cached = metrics_cache.get(request.full_path)
+    if cached is not None: return jsonify(cached)
+    query = build_filtered_query(select(
+        Feedback.day, func.avg(Feedback.sentiment_score).label('average_sentiment')
+    ).group_by(Feedback.day).order_by(Feedback.day))
     if query is None: return jsonify({"error": "Invalid date format"}), 400
-    daily_trend = query.with_entities(
-        func.strftime('%Y-%m-%d', Feedback.timestamp).label('date'),
-        func.avg(Feedback.sentiment_score).label('average_sentiment')
-    ).group_by(func.strftime('%Y-%m-%d', Feedback.timestamp)).order_by('date').all()
     results = []
-    for row in daily_trend:
-        results.append({ "date": row.date, "average_sentiment": row.average_sentiment })
+    for row in db.session.execute(query):
+        # Rows written outside the ORM may still have no day
+        if row.day is None: continue
+        # One string format per day rather than one per row in SQLite
+        date_str = f"{row.day // 10000:04d}-{row.day // 100 % 100:02d}-{row.day % 100:02d}"
+        results.append({ "date": date_str, "average_sentiment": row.average_sentiment })
+    metrics_cache.set(request.full_path, results)
     return jsonify(results)
 
 @app.route('/v1/stores', methods=['POST'])
@@ -211,7 +473,7 @@ def get_areas():
 def hello():
     return "Hello! Your feedback server is running."
 
-# --- 4. Run the App (UPDATED) ---
+# --- 5. Run the App (UPDATED) ---
 if __name__ == '__main__':
     with app.app_context():
         db.create_all() 
@@ -0,0 +1,266 @@
+import _thread
+import abc
+import functools
+import os
+import re
+import numpy as np
+import torch
+try:
+    from eventlet.patcher import original
+except ImportError:
+    original = None
+
+# --- ML IMPORTS ---
+# 'embedding' (default) scores feedback against precomputed label embeddings.
+# 'zeroshot' keeps the original BART-large-MNLI model around for A/B runs.
+CLASSIFIER_BACKEND = os.environ.get('CLASSIFIER_BACKEND', 'embedding')
+# How the zero-shot model is run: 'torch' (the model called directly with the
+# text/label pairs of a batch of texts at once), 'pipeline' (the transformers pipeline) or
+# 'onnx' (int8, produced by export_onnx.py).
+ZEROSHOT_RUNTIME = os.environ.get('ZEROSHOT_RUNTIME', 'torch')
+ZEROSHOT_MODEL = "facebook/bart-large-mnli"
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR', os.path.join(basedir, 'onnx', 'bart-large-mnli'))
+
+CANDIDATE_LABELS = ["Quality of food", "Customer service", "Speed", "Ambience"]
+
+# --- Keyword gating ---
+# Feedback that is clearly about one category ("food was cold") is labelled
+# from keywords alone and never reaches the model. A text is gated when its
+# best label's hits make up at least KEYWORD_MIN_SCORE of its words and no
+# other label has any hit; everything else goes to the model.
+KEYWORD_GATING = os.environ.get('KEYWORD_GATING', '1') == '1'
+KEYWORD_MIN_SCORE = 0.5
+KEYWORD_CONFIDENCE = 0.9
+KEYWORDS = {
+    "Quality of food": re.compile(r"\b(food|meal|dish|taste|tasty|cold|stale|spic|bland|delicious|burnt|undercook|overcook)\w*", re.I),
+    "Customer service": re.compile(r"\b(waiter|waitress|staff|rude|polite|friendly|manager|server|service|attitude)\w*", re.I),
+    # "wait" but not "waiter"/"waitress", which are about service
+    "Speed": re.compile(r"\b(slow|fast|quick|minute|hour|delay|late|wait(?!er|ress))\w*", re.I),
+    "Ambience": re.compile(r"\b(ambien|atmosphere|music|noisy|noise|loud|decor|dirty|clean|cozy|lighting|vibe)\w*", re.I),
+}
+WORD_RE = re.compile(r"\w+")
+
+def keyword_category(text):
+    """
+    Returns the category when the keywords leave no doubt, otherwise None.
+    """
+    n_words = len(WORD_RE.findall(text))
+    if not n_words: return None
+    scores = sorted(((len(pattern.findall(text)) / n_words, label) for label, pattern in KEYWORDS.items()), reverse=True)
+    (top, label), (second, _) = scores[0], scores[1]
+    if top >= KEYWORD_MIN_SCORE and second == 0: return label
+    return None
+
+# --- PyTorch runtime tuning ---
+# Intra-op threads do the GEMM work; inter-op parallelism only adds contention.
+torch.set_num_threads(int(os.environ.get('TORCH_NUM_THREADS', os.cpu_count())))
+torch.set_num_interop_threads(1)
+# BF16 autocast only pays off where oneDNN has bf16 kernels for this CPU
+BF16_SUPPORTED = torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+TORCH_BF16 = os.environ.get('TORCH_BF16', '1' if BF16_SUPPORTED else '0') == '1'
+# TorchScript tracing of the direct-model runtime, used when oneDNN is available
+TORCH_JIT = os.environ.get('TORCH_JIT', '1' if torch.backends.mkldnn.is_available() else '0') == '1'
+
+def autocast():
+    # The weight-cast cache has to be off while tracing; at inference it only
+    # lives for one autocast block anyway.
+    return torch.autocast(device_type='cpu', dtype=torch.bfloat16, enabled=TORCH_BF16, cache_enabled=False)
+
+class ZeroShotClassifier(abc.ABC):
+    """
+    Drop-in replacement for the zero-shot pipeline that tokenizes the
+    (text, label) pairs of batch_size texts at a time (1 if None, as the
+    pipeline does) and scores each batch in one forward pass of
+    batch_size * len(labels) rows. Returns the same
+    {'sequence', 'labels', 'scores'} dicts as the pipeline.
+    Subclasses provide entailment_logits() for their runtime.
+    """
+    return_tensors = 'np'
+
+    def __init__(self, tokenizer, label2id):
+        self.tokenizer = tokenizer
+        self.entailment_id = next(i for label, i in label2id.items() if label.lower().startswith('entail'))
+
+    def prepare(self):
+        """
+        Finishes setting up the runtime in the process that will classify.
+        __init__ only loads weights, so it is safe to run before a fork.
+        """
+
+    @abc.abstractmethod
+    def entailment_logits(self, encoded):
+        """Returns the entailment logit of every encoded pair as a numpy array."""
+
+    def __call__(self, sequences, candidate_labels, hypothesis_template="This example is {}.", batch_size=None):
+        single = isinstance(sequences, str)
+        if single: sequences = [sequences]
+        batch_size = batch_size or 1
+        hypotheses = [hypothesis_template.format(label) for label in candidate_labels]
+        logits = []
+        for start in range(0, len(sequences), batch_size):
+            batch = sequences[start:start + batch_size]
+            premises = [text for text in batch for _ in candidate_labels]
+            encoded = self.tokenizer(premises, hypotheses * len(batch), padding=True,
+                                     truncation='only_first', return_tensors=self.return_tensors)
+            logits.append(self.entailment_logits(encoded))
+        # Softmax of the entailment logits across the labels, as the pipeline does
+        entailment = np.concatenate(logits).reshape(len(sequences), len(candidate_labels))
+        entailment = np.exp(entailment - entailment.max(axis=1, keepdims=True))
+        scores = entailment / entailment.sum(axis=1, keepdims=True)
+        results = []
+        for text, row in zip(sequences, scores):
+            order = row.argsort()[::-1]
+            results.append({
+                "sequence": text, "labels": [candidate_labels[i] for i in order],
+                "scores": [float(row[i]) for i in order]
+            })
+        return results[0] if single else results
+
+class _LogitsOnly(torch.nn.Module):
+    # torch.jit.trace needs plain tensors in and out, not a ModelOutput
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+class TorchZeroShotClassifier(ZeroShotClassifier):
+    """Runs the PyTorch model directly, without the pipeline's per-pair loop."""
+    return_tensors = 'pt'
+
+    def __init__(self, model_name):
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+        super().__init__(AutoTokenizer.from_pretrained(model_name), model.config.label2id)
+        self.model = _LogitsOnly(model).eval()
+
+    def prepare(self):
+        # Tracing runs a forward pass, so it waits until after the fork
+        if TORCH_JIT:
+            torch._C._jit_set_texpr_fuser_enabled(True)
+            # The bf16 casts are recorded into the graph while tracing,
+            # so the JIT's own autocast pass stays off.
+            torch._C._jit_set_autocast_mode(False)
+            example = self.tokenizer(["Example."], ["This example is example."], return_tensors='pt')
+            with torch.no_grad(), autocast():
+                traced = torch.jit.trace(self.model, (example['input_ids'], example['attention_mask']))
+            self.model = torch.jit.freeze(traced)
+
+    def entailment_logits(self, encoded):
+        with torch.inference_mode(), autocast():
+            logits = self.model(encoded['input_ids'], encoded['attention_mask'])
+        return logits[:, self.entailment_id].float().numpy()
+
+class OnnxZeroShotClassifier(ZeroShotClassifier):
+    """Runs the int8 quantized model with ONNX Runtime."""
+    def __init__(self, model_dir):
+        from transformers import AutoConfig, AutoTokenizer
+        super().__init__(AutoTokenizer.from_pretrained(model_dir), AutoConfig.from_pretrained(model_dir).label2id)
+        self.model_dir = model_dir
+
+    def prepare(self):
+        # The session starts its own thread pool, which wouldn't survive a fork
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(
+            os.path.join(self.model_dir, 'model_quantized.onnx'), providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def entailment_logits(self, encoded):
+        feeds = {name: value for name, value in encoded.items() if name in self.input_names}
+        return self.session.run(None, feeds)[0][:, self.entailment_id]
+
+# --- Load the ML Model ---
+# Loading is deferred to the first classification so processes that never
+# classify (or only serve stores/areas) don't pay for the weights. Under
+# Gunicorn, gunicorn.conf.py calls load_model() in the master before forking
+# so the workers share the weight pages copy-on-write. Nothing that runs the
+# model happens there: OpenMP's thread pool doesn't survive a fork, and a
+# worker whose parent already ran a forward pass hangs on its own first one.
+# lru_cache doesn't stop two threads that miss together from both loading the
+# weights, so loads are serialised. The lock is a real OS lock even under
+# eventlet's monkey-patching, since callers run in tpool's native threads.
+_load_lock = (original('_thread') if original else _thread).allocate_lock()
+
+@functools.lru_cache(maxsize=None)
+def load_model():
+    """
+    Loads the configured model's weights without running it.
+    """
+    print(f"Loading classification model ({CLASSIFIER_BACKEND})...")
+    if CLASSIFIER_BACKEND == 'zeroshot' and ZEROSHOT_RUNTIME == 'onnx':
+        model = OnnxZeroShotClassifier(ONNX_MODEL_DIR)
+    elif CLASSIFIER_BACKEND == 'zeroshot' and ZEROSHOT_RUNTIME == 'pipeline':
+        from transformers import pipeline
+        model = pipeline("zero-shot-classification", model=ZEROSHOT_MODEL)
+    elif CLASSIFIER_BACKEND == 'zeroshot':
+        model = TorchZeroShotClassifier(ZEROSHOT_MODEL)
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer('all-MiniLM-L6-v2')
+    print("Model loaded successfully.")
+    return model
+
+def get_classifier():
+    """
+    Returns the zero-shot classifier, or (encoder, label embeddings) for the
+    embedding backend, loading and preparing it on the first call.
+    """
+    with _load_lock:
+        return _prepare_classifier()
+
+@functools.lru_cache(maxsize=None)
+def _prepare_classifier():
+    model = load_model()
+    if CLASSIFIER_BACKEND != 'zeroshot':
+        # The labels never change, so they are embedded exactly once: float32, shape [4, 384]
+        with torch.inference_mode(), autocast():
+            label_emb = model.encode(CANDIDATE_LABELS, normalize_embeddings=True)
+        return (model, label_emb)
+    if isinstance(model, ZeroShotClassifier): model.prepare()
+    return model
+
+def classify(texts):
+    """
+    Classifies a batch of feedback texts into one of CANDIDATE_LABELS.
+    Returns a (category, confidence) pair for each text.
+    """
+    results = [None] * len(texts)
+    ambiguous = []
+    for i, text in enumerate(texts):
+        label = keyword_category(text) if KEYWORD_GATING else None
+        if label is None: ambiguous.append(i)
+        else: results[i] = (label, KEYWORD_CONFIDENCE)
+    if ambiguous:
+        for i, result in zip(ambiguous, classify_with_model([texts[i] for i in ambiguous])):
+            results[i] = result
+    return results
+
+def classify_with_model(texts):
+    """
+    Runs the configured model over texts; the expensive half of classify().
+    """
+    batch_size = min(32, len(texts))
+    if CLASSIFIER_BACKEND == 'zeroshot':
+        zero_shot = get_classifier()
+        if ZEROSHOT_RUNTIME == 'pipeline':
+            # The direct-model and ONNX runtimes manage their own inference modes
+            with torch.inference_mode(), autocast():
+                results = zero_shot(texts, CANDIDATE_LABELS, batch_size=batch_size)
+        else:
+            results = zero_shot(texts, CANDIDATE_LABELS, batch_size=batch_size)
+        # The pipeline returns a bare dict when it was given a single text
+        if isinstance(results, dict): results = [results]
+        return [(result['labels'][0], result['scores'][0]) for result in results]
+
+    encoder, label_emb = get_classifier()
+    # One encoder pass for the whole batch, then a 4-way cosine similarity per text
+    # (the embeddings are normalized, so the dot product is the cosine).
+    with torch.inference_mode(), autocast():
+        vectors = encoder.encode(texts, normalize_embeddings=True, batch_size=batch_size)
+    scores = vectors @ label_emb.T
+    best = scores.argmax(axis=1)
+    return [(CANDIDATE_LABELS[i], float(scores[row, i])) for row, i in enumerate(best)]
@@ -0,0 +1,31 @@
+import os
+from transformers import AutoTokenizer
+from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+# One-shot conversion of the zero-shot model to an int8 ONNX model.
+# Run it once, then start the server with ZEROSHOT_RUNTIME=onnx.
+MODEL_NAME = "facebook/bart-large-mnli"
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+EXPORT_DIR = os.environ.get('ONNX_MODEL_DIR', os.path.join(basedir, 'onnx', 'bart-large-mnli'))
+
+def export_quantized_model(model_name, export_dir):
+    """
+    Exports the model to ONNX and applies dynamic int8 quantization,
+    writing model_quantized.onnx (plus tokenizer and config) to export_dir.
+    """
+    print(f"Exporting {model_name} to ONNX...")
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+    model.save_pretrained(export_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    print("Quantizing to int8...")
+    quantizer = ORTQuantizer.from_pretrained(model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=export_dir, quantization_config=qconfig)
+    print(f"Saved quantized model to {export_dir}")
+
+# --- Main part of the script ---
+if __name__ == "__main__":
+    export_quantized_model(MODEL_NAME, EXPORT_DIR)
@@ -0,0 +1,27 @@
+import os
+
+# Launch with: gunicorn -c gunicorn.conf.py app:app
+# Every worker serves HTTP and Socket.IO; emits fan out between workers
+# through the Redis message queue configured in app.py.
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'eventlet'
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+# Import the app in the master and load the model there before the workers
+# fork, so they share one copy of the weights instead of one each.
+preload_app = True
+
+def when_ready(server):
+    # Weights only, on one thread: a master that has started OpenMP's thread
+    # pool forks workers that hang on their first forward pass. The label
+    # embeddings and JIT trace are done by each worker on its first call.
+    import torch
+    from classifier import load_model
+    torch.set_num_threads(1)
+    load_model()
+
+def post_fork(server, worker):
+    # Give each worker its own intra-op thread pool rather than the master's,
+    # split across the workers so together they don't oversubscribe the cores
+    import torch
+    torch.set_num_threads(int(os.environ.get('TORCH_NUM_THREADS', max(1, os.cpu_count() // server.cfg.workers))))
@@ -1,76 +1,98 @@
 import requests
 import json
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import lxml.etree
+import lxml.html
 import os
 
 # The URL of the API you already built
-API_URL = "http://127.0.0.1:5000/v1/feedback"
+API_URL = "http://127.0.0.1:5000/v1/feedback/batch"
 
 # --- 1. CHANGE THE TARGET URL ---
 TARGET_URL = "http://quotes.toscrape.com/" 
 
-def post_feedback_to_api(platform, text, store_id):
+# Reviews are sent to the batch endpoint in chunks of this size,
+# with up to MAX_WORKERS chunks in flight at once
+BATCH_SIZE = 32
+MAX_WORKERS = 8
+
+# Compiled once; each returns plain strings straight from lxml's C parser
+QUOTES_XPATH = lxml.etree.XPath('//div[contains(concat(" ", normalize-space(@class), " "), " quote ")]')
+TEXT_XPATH = lxml.etree.XPath('string(.//span[contains(concat(" ", normalize-space(@class), " "), " text ")])')
+AUTHOR_XPATH = lxml.etree.XPath('string(.//small[contains(concat(" ", normalize-space(@class), " "), " author ")])')
+
+def make_session():
     """
-    Takes data and POSTs it to our Flask API.
+    Creates a session whose connection pool keeps enough keep-alive
+    connections open for all the POST threads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def post_feedback_to_api(session, payloads):
+    """
+    Takes a list of feedback payloads and POSTs them to our Flask API in one request.
+    Returns how many were accepted.
     """
-    payload = {
-        "platform": platform,
-        "text": text,
-        "store_id": store_id
-    }
-    
     try:
-        response = requests.post(API_URL, json=payload)
+        response = session.post(API_URL, json={"items": payloads})
         if response.status_code == 201:
-            print(f"  > Successfully posted: {text}")
+            print(f"  > Successfully posted {len(payloads)} reviews")
         else:
             print(f"  > Error posting feedback. Status code: {response.status_code}")
+            return 0
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to the API. Is your Flask server running?")
-        return False
-    return True
+        return 0
+    return len(payloads)
 
 def scrape_live_website(url):
     """
-    Downloads a live web page and parses it with BeautifulSoup.
+    Downloads a live web page and parses it with lxml.
     """
     print(f"Attempting to download page: {url}")
     
+    session = make_session()
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         
         if response.status_code != 200:
             print(f"Error: Failed to download website. Status code: {response.status_code}")
             return
             
-        html_content = response.text
-        soup = BeautifulSoup(html_content, 'html.parser')
+        # Bytes, so lxml honours the page's own encoding declaration
+        html_content = response.content
+        tree = lxml.html.fromstring(html_content)
         
         
         # --- 2. CHANGE THE PARSING LOGIC ---
         # "Inspect" quotes.toscrape.com, you'll find these tags:
+        # each quote is a <div class="quote"> holding the text in <span class="text">
+        # and the "platform" (the author) in <small class="author">.
+        # We'll hard-code all these to Store ID 1 ("Downtown Diner")
+        payloads = [
+            {
+                "platform": AUTHOR_XPATH(quote).strip(),
+                "text": TEXT_XPATH(quote).strip(),
+                "store_id": 1
+            }
+            for quote in QUOTES_XPATH(tree)
+        ]
         
-        # Find all divs with the class "quote"
-        reviews = soup.find_all('div', class_='quote') 
-        
-        print(f"Found {len(reviews)} reviews (quotes). Posting to API...")
+        print(f"Found {len(payloads)} reviews (quotes). Posting to API...")
         
-        for review in reviews:
-            # Find the text (a <span> with class "text")
-            text = review.find('span', class_='text').text.strip()
-            
-            # Find the "platform" (the <small> tag with class "author")
-            platform = review.find('small', class_='author').text.strip()
-            
-            # We'll hard-code all these to Store ID 1 ("Downtown Diner")
-            store_id = 1 
-            
-            print(f"\nProcessing quote from {platform}...")
-            if not post_feedback_to_api(platform, text, store_id):
-                break
+        # The chunks are independent, so their POSTs overlap on the session's keep-alive connections
+        chunks = [payloads[i:i + BATCH_SIZE] for i in range(0, len(payloads), BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(executor.map(lambda chunk: post_feedback_to_api(session, chunk), chunks))
+        print(f"\nPosted {sum(results)} of {len(payloads)} reviews.")
                 
     except requests.exceptions.RequestException as e:
         print(f"Error: Failed to connect to {url}. {e}")
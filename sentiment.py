@@ -0,0 +1,205 @@
+import os
+import re
+from itertools import chain
+from xml.etree import ElementTree
+import numpy as np
+import textblob
+from textblob._text import EMOTICONS as TEXTBLOB_EMOTICONS, PUNCTUATION
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# --- Lexicon ---
+# The same en-sentiment.xml lexicon TextBlob uses, parsed once at import into
+# plain dicts so scoring a text is a dict lookup per token instead of building
+# a TextBlob for every request.
+LEXICON_PATH = os.path.join(os.path.dirname(textblob.__file__), 'en', 'en-sentiment.xml')
+
+NEGATIONS = {"no", "not", "n't", "never"}
+# Emoticons score as a word of their own (":)" is +0.5), taken from TextBlob's
+# table with the same filter it applies: not alphabetic, at most 5 characters
+EMOTICONS = {face: p for (_, p), faces in TEXTBLOB_EMOTICONS.items() for face in map(str.lower, faces)
+             if not face.isalpha() and len(face) <= 5 and face not in PUNCTUATION}
+# Splits "don't" into "do" + "n't" like TextBlob's tokenizer; "!" boosts the
+# previous word. Emoticons only count when they stand apart from other text.
+TOKEN_RE = re.compile(r"(?<!\S)(?:%s)(?!\S)|[a-z]+(?=n't)|n't|[a-z']+|!"
+                      % "|".join(map(re.escape, sorted(EMOTICONS, key=len, reverse=True))))
+
+def _avg(values):
+    return sum(values) / len(values)
+
+def load_lexicon(path):
+    """
+    Returns (polarity, intensity, modifiers): per-word scores averaged over
+    all senses, and the set of adverbs that modify the next word.
+    """
+    senses = {}
+    for w in ElementTree.parse(path).getroot().findall('word'):
+        form = w.attrib.get('form')
+        if not form: continue
+        psi = (float(w.attrib.get('polarity', 0.0)), float(w.attrib.get('intensity', 1.0)))
+        senses.setdefault(form, {}).setdefault(w.attrib.get('pos'), []).append(psi)
+    polarity, intensity, modifiers = {}, {}, set()
+    adjectives = {}
+    for form, by_pos in senses.items():
+        # Average per part-of-speech first, then across parts-of-speech
+        per_pos = {pos: [_avg(each) for each in zip(*psi)] for pos, psi in by_pos.items()}
+        polarity[form], intensity[form] = [_avg(each) for each in zip(*per_pos.values())]
+        if 'RB' in per_pos: modifiers.add(form)
+        if 'JJ' in per_pos: adjectives[form] = per_pos['JJ']
+    # Map "terrible" to the adverb "terribly", as TextBlob does
+    for form, (p, i) in adjectives.items():
+        if form.endswith('y'): form = form[:-1] + 'i'
+        if form.endswith('le'): form = form[:-2]
+        polarity[form + 'ly'], intensity[form + 'ly'] = p, i
+        modifiers.add(form + 'ly')
+    return polarity, intensity, modifiers
+
+POLARITY, INTENSITY, MODIFIERS = load_lexicon(LEXICON_PATH)
+
+def polarity(text):
+    """
+    Returns the polarity of text between -1.0 and 1.0, following TextBlob's
+    pattern rules: a modifier scales the next known word ("very good"), a
+    negation flips it to half strength ("not good"), "!" boosts it and an
+    emoticon counts as a word of its own.
+    """
+    scores = []  # [polarity, intensity, negated] per known word
+    modifier = negation = None
+    for word in TOKEN_RE.findall(text.lower()):
+        if word in POLARITY:
+            p, i = POLARITY[word], INTENSITY[word]
+            if modifier is None:
+                scores.append([p, i, False])
+            else:
+                scores[-1][0] = max(-1.0, min(p * scores[-1][1], 1.0))
+                scores[-1][1] = i
+            if negation is not None:
+                scores[-1][1] = 1.0 / scores[-1][1]
+                scores[-1][2] = True
+            modifier = word if word in MODIFIERS else None
+            negation = word if word in NEGATIONS else None
+            continue
+        if word in NEGATIONS:
+            negation = word
+        # Negations and modifiers carry across small words ("not a good")
+        elif negation and len(word.strip("'")) > 1:
+            negation = None
+        if negation is not None and modifier is not None and modifier.endswith('ly'):
+            scores[-1][2] = True
+            negation = None
+        elif modifier and len(word) > 2:
+            modifier = None
+        if word == '!' and scores:
+            scores[-1][0] = max(-1.0, min(scores[-1][0] * 1.25, 1.0))
+        if word in EMOTICONS:
+            scores.append([EMOTICONS[word], 1.0, False])
+    # Short texts with no known words are neutral without any arithmetic
+    if not scores: return 0.0
+    return sum(p * -0.5 if negated else p for p, _, negated in scores) / len(scores)
+
+# --- Batch fast path ---
+# polarity_batch() scores many texts in one compiled call. Each token becomes
+# a vocabulary id (-1 if unknown) plus a few flag bits, and _batch_polarity()
+# runs the same rules as polarity() over the flat id array with per-text
+# offsets. The rules look at neighbouring tokens, so this is a compiled loop
+# rather than a plain per-document average. Emoticons share the lookup
+# tables but carry EMOTICON_FLAG, since they don't take part in the rules.
+VOCAB = sorted(POLARITY) + sorted(EMOTICONS)
+WORD_IDS = {w: i for i, w in enumerate(VOCAB)}
+POLARITY_LUT = np.array([POLARITY.get(w, EMOTICONS.get(w)) for w in VOCAB], dtype=np.float64)
+INTENSITY_LUT = np.array([INTENSITY.get(w, 1.0) for w in VOCAB], dtype=np.float64)
+MODIFIER_LUT = np.array([w in MODIFIERS for w in VOCAB], dtype=np.bool_)
+LY_LUT = np.array([w.endswith('ly') for w in VOCAB], dtype=np.bool_)
+
+NEGATION_FLAG = 1  # word in NEGATIONS
+KEEP_NEGATION_FLAG = 2  # too short to end a negation ("not a good")
+KEEP_MODIFIER_FLAG = 4  # too short to end a modifier ("really is a good")
+BANG_FLAG = 8  # "!"
+EMOTICON_FLAG = 16  # word in EMOTICONS
+
+class _TokenCodes(dict):
+    # word -> (vocabulary id + 1) << 5 | flags, filled in on first sight so
+    # encoding a text is a C-level map over its tokens
+    def __missing__(self, word):
+        flags = 0
+        if word in NEGATIONS: flags |= NEGATION_FLAG
+        if len(word.strip("'")) <= 1: flags |= KEEP_NEGATION_FLAG
+        if len(word) <= 2: flags |= KEEP_MODIFIER_FLAG
+        if word == '!': flags |= BANG_FLAG
+        if word in EMOTICONS: flags |= EMOTICON_FLAG
+        code = (WORD_IDS.get(word, -1) + 1) << 5 | flags
+        # Bounded, since unknown words come straight from user input
+        if len(self) < 100000: self[word] = code
+        return code
+
+_token_codes = _TokenCodes()
+
+def _batch_polarity(ids, flags, offsets, pol, inten, is_mod, is_ly):
+    out = np.zeros(len(offsets) - 1)
+    p_buf = np.empty(len(ids))
+    i_buf = np.empty(len(ids))
+    neg_buf = np.empty(len(ids), dtype=np.bool_)
+    for d in range(len(offsets) - 1):
+        count = 0
+        modifier = -1
+        negation = False
+        for t in range(offsets[d], offsets[d + 1]):
+            w = ids[t]
+            f = flags[t]
+            if w >= 0 and not (f & EMOTICON_FLAG):
+                if modifier < 0:
+                    p_buf[count] = pol[w]
+                    i_buf[count] = inten[w]
+                    neg_buf[count] = False
+                    count += 1
+                else:
+                    p_buf[count - 1] = max(-1.0, min(pol[w] * i_buf[count - 1], 1.0))
+                    i_buf[count - 1] = inten[w]
+                if negation:
+                    i_buf[count - 1] = 1.0 / i_buf[count - 1]
+                    neg_buf[count - 1] = True
+                modifier = w if is_mod[w] else -1
+                negation = (f & NEGATION_FLAG) != 0
+                continue
+            if f & NEGATION_FLAG:
+                negation = True
+            elif negation and not (f & KEEP_NEGATION_FLAG):
+                negation = False
+            if negation and modifier >= 0 and is_ly[modifier]:
+                neg_buf[count - 1] = True
+                negation = False
+            elif modifier >= 0 and not (f & KEEP_MODIFIER_FLAG):
+                modifier = -1
+            if (f & BANG_FLAG) and count > 0:
+                p_buf[count - 1] = max(-1.0, min(p_buf[count - 1] * 1.25, 1.0))
+            if f & EMOTICON_FLAG:
+                p_buf[count] = pol[w]
+                i_buf[count] = 1.0
+                neg_buf[count] = False
+                count += 1
+        if count > 0:
+            total = 0.0
+            for k in range(count):
+                total += p_buf[k] * -0.5 if neg_buf[k] else p_buf[k]
+            out[d] = total / count
+    return out
+
+if njit is not None:
+    _batch_polarity = njit(cache=True, nogil=True)(_batch_polarity)
+
+def polarity_batch(texts):
+    """
+    Returns polarity(text) for every text, computed in one compiled call
+    when numba is installed.
+    """
+    if njit is None: return [polarity(text) for text in texts]
+    tokens = [TOKEN_RE.findall(text.lower()) for text in texts]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(doc) for doc in tokens])
+    codes = np.fromiter(map(_token_codes.__getitem__, chain.from_iterable(tokens)), dtype=np.int32, count=offsets[-1])
+    ids = (codes >> 5) - 1
+    flags = codes & 31
+    scores = _batch_polarity(ids, flags, offsets, POLARITY_LUT, INTENSITY_LUT, MODIFIER_LUT, LY_LUT)
+    return scores.tolist()
@@ -0,0 +1,39 @@
+import pytest
+
+import classifier
+from classifier import KEYWORD_CONFIDENCE, classify, keyword_category
+
+@pytest.mark.parametrize('text, expected', [
+    ("food was cold", "Quality of food"),
+    # One hit in two words is exactly KEYWORD_MIN_SCORE
+    ("too slow", "Speed"),
+    # "waiter" is about service, not a "wait"
+    ("waiter rude", "Customer service"),
+    ("long wait", "Speed"),
+])
+def test_unambiguous_text_is_labelled(text, expected):
+    assert keyword_category(text) == expected
+
+@pytest.mark.parametrize('text', [
+    # A hit for a second label sends it to the model
+    "the food was cold and the waiter was rude",
+    # Too few keywords for the length of the text
+    "we came here for a birthday dinner with the whole family and the food",
+    "",
+    "!!!",
+])
+def test_ambiguous_text_falls_through(text):
+    assert keyword_category(text) is None
+
+def test_classify_only_runs_the_model_on_ambiguous_text(monkeypatch):
+    seen = []
+    def classify_with_model(texts):
+        seen.extend(texts)
+        return [("Ambience", 0.5) for _ in texts]
+    monkeypatch.setattr(classifier, 'KEYWORD_GATING', True)
+    monkeypatch.setattr(classifier, 'classify_with_model', classify_with_model)
+    texts = ["too slow", "the food was cold and the waiter was rude", "waiter rude"]
+    assert classify(texts) == [
+        ("Speed", KEYWORD_CONFIDENCE), ("Ambience", 0.5), ("Customer service", KEYWORD_CONFIDENCE)
+    ]
+    assert seen == ["the food was cold and the waiter was rude"]
@@ -0,0 +1,45 @@
+import random
+import re
+
+import pytest
+from textblob import TextBlob
+from textblob._text import EMOTICONS as TEXTBLOB_EMOTICONS
+
+from sentiment import EMOTICONS, MODIFIERS, NEGATIONS, POLARITY, polarity, polarity_batch
+
+# Contractions are split differently from TextBlob on purpose, so the random
+# sentences stick to plain words, negations, modifiers, "!" and emoticons.
+# Emoticons are written as TextBlob lists them, since its tokenizer only
+# keeps ":D" whole in that case.
+WORDS = sorted(w for w in POLARITY if re.fullmatch(r'[a-z]+', w))
+FACES = sorted(face for faces in TEXTBLOB_EMOTICONS.values() for face in faces if face.lower() in EMOTICONS)
+FILLERS = ['a', 'the', 'is', 'it', 'of', 'was', 'food', 'staff', 'order', 'i']
+POOL = (WORDS + sorted(w for w in MODIFIERS if w in WORDS) * 3 + sorted(NEGATIONS - {"n't"}) * 40
+        + FILLERS * 40 + ['!'] * 60 + FACES * 2)
+
+def random_sentences(count, seed=0):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(POOL) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+SENTENCES = random_sentences(5000)
+
+def test_polarity_matches_textblob():
+    mismatches = [(s, polarity(s), TextBlob(s).sentiment.polarity) for s in SENTENCES
+                  if polarity(s) != pytest.approx(TextBlob(s).sentiment.polarity, abs=1e-9)]
+    assert mismatches == []
+
+@pytest.mark.parametrize('text, expected', [
+    ("The staff were okay :-(", -0.125),
+    ("Waited 40 minutes for my order :(", -0.75),
+    ("Food arrived :)", 0.5),
+])
+def test_emoticons(text, expected):
+    assert polarity(text) == pytest.approx(expected)
+    assert polarity_batch([text]) == pytest.approx([expected])
+
+def test_polarity_batch_matches_polarity():
+    assert polarity_batch(SENTENCES) == pytest.approx([polarity(s) for s in SENTENCES], abs=1e-12)
+
+def test_polarity_batch_empty():
+    assert polarity_batch([]) == []
+    assert polarity_batch(['']) == [0.0]